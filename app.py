@@ -54,14 +54,22 @@ class App:
                 self.listen(event)
 
             self.update(self.dt)
-            pygame.display.flip()
+            self.present()
             self.dt = self.clock.tick(self.FPS)
 
+        self.teardown()
         pygame.quit()
 
     def setup(self):
         pass
 
+    def teardown(self):
+        pass
+
+    def present(self):
+        # push the frame to the window (overload to update only parts of it)
+        pygame.display.flip()
+
     def draw(self, screen):
         pass
 
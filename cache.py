@@ -0,0 +1,102 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+
+CachedAnalysis = namedtuple('CachedAnalysis', 'depth score bestmove pv')
+
+
+class AnalysisCache:
+    """
+    Disk-backed analysis cache shared by all processes on one machine
+    (SQLite in WAL mode), keyed by Janggi.fen(). Capped at max_entries:
+    the oldest written entries are evicted first. Best effort: once open,
+    a database error is a miss (get) or a dropped write (put)
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS analysis (
+            key      TEXT PRIMARY KEY,
+            depth    INTEGER NOT NULL,
+            score    INTEGER NOT NULL,
+            bestmove TEXT,
+            pv       TEXT NOT NULL,
+            written  REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS analysis_written ON analysis (written);
+    '''
+
+    def __init__(self, path, max_entries=1000000, evict_every=1000, timeout=10.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every  # puts between size checks
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self._conn, self._pid = None, None
+        self._puts = 0
+        with self.lock:
+            self.conn.executescript(self.schema)
+
+    @property
+    def conn(self):
+        # connections must not cross a fork, so one per process
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key):
+        try:
+            with self.lock:
+                row = self.conn.execute('SELECT depth, score, bestmove, pv FROM analysis WHERE key = ?',
+                                        (key,)).fetchone()
+        except sqlite3.Error:  # locked, busy, disk trouble: a miss
+            return None
+        if row is None:
+            return None
+        depth, score, bestmove, pv = row
+        return CachedAnalysis(depth, score, bestmove, pv.split())
+
+    def put(self, key, depth, score, bestmove, pv):
+        # deeper analysis of the same position is never overwritten
+        with self.lock:
+            try:
+                self.conn.execute('''
+                    INSERT INTO analysis (key, depth, score, bestmove, pv, written)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        depth = excluded.depth, score = excluded.score,
+                        bestmove = excluded.bestmove, pv = excluded.pv,
+                        written = excluded.written
+                    WHERE excluded.depth >= analysis.depth
+                ''', (key, depth, score, bestmove, ' '.join(pv), time.time()))
+                self._puts += 1
+                if not self._puts % self.evict_every:
+                    self._evict()
+            except sqlite3.Error:  # the write (and trim) is dropped
+                pass
+
+    def _evict(self):
+        # down to 90% of the cap, so eviction does not run on every put
+        count, = self.conn.execute('SELECT COUNT(*) FROM analysis').fetchone()
+        if count > self.max_entries:
+            self.conn.execute('''
+                DELETE FROM analysis WHERE key IN (
+                    SELECT key FROM analysis ORDER BY written LIMIT ?)
+            ''', (count - self.max_entries * 9 // 10,))
+
+    def __len__(self):
+        with self.lock:
+            count, = self.conn.execute('SELECT COUNT(*) FROM analysis').fetchone()
+        return count
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn, self._pid = None, None
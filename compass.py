@@ -72,6 +72,15 @@ class Compass(Enum):
                 (-1, 1): cls['SW'],
                 (-1, 0): cls['W' ]}[xy_tup]
 
+    @classmethod
+    def code(cls, key):
+        # integer 0-7 (clockwise from NW), cheap to store and compare
+        return list(cls).index(cls[cls._get_name(key)])
+
+    @classmethod
+    def from_code(cls, code):
+        return list(cls)[code]
+
     @classmethod
     def get(cls, names):
         iterator = names.split() if isinstance(names, str) else names
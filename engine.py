@@ -0,0 +1,461 @@
+"""
+Line-based engine protocol for Janggi (in the spirit of UCI).
+
+GUI -> engine
+    jgi                                 handshake, answered by id lines and 'jgiok'
+    isready                             answered by 'readyok'
+    setoption name <name> value <value> e.g. 'setoption name Cache value analysis.db'
+    newgame                             forget everything learnt so far
+    position startpos [moves m1 m2 ..]  set position (steps as in Janggi.step_to_str)
+    position fen <fen> [moves m1 ..]    (fen as in Janggi.fen, e.g. 'm..G/kpPK/g..M - g')
+    go [depth N] [movetime MS] [ponder] start searching the current position
+    ponderhit                           the pondered step was played, go on searching
+    stop                                stop searching, 'bestmove' is sent anyway
+    quit
+
+engine -> GUI
+    id name <name>
+    info depth N score S nodes N pv m1 m2 ..
+    info string <text>
+    bestmove <step> [ponder <step>]     '(none)' when there is no step to play
+"""
+import sys
+import sqlite3
+import time
+import queue
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from janggi import Janggi
+from search import SearchPlayer
+from cache import AnalysisCache
+
+
+Analysis = namedtuple('Analysis', 'bestmove ponder score depth pv')
+
+
+class EngineError(Exception):
+    pass
+
+
+
+class Engine:
+    """
+    Speaks the protocol above over stdin/stdout on behalf of a SearchPlayer
+    """
+
+    name = 'Janggi SearchPlayer'
+    author = 'mrossetti'
+
+    def __init__(self, player=None, stdin=sys.stdin, stdout=sys.stdout):
+        self.player = player or SearchPlayer()
+        self.game = Janggi()
+        self.game.reset()
+        self.stdin, self.stdout = stdin, stdout
+        self.out_lock = threading.Lock()
+        self.thread = None
+        self.pondering = False
+        self.ponder_done = threading.Event()  # set on ponderhit / stop
+        self.movetime = None
+
+    def send(self, line):
+        with self.out_lock:
+            self.stdout.write(line + '\n')
+            self.stdout.flush()
+
+    def run(self):
+        for line in self.stdin:
+            tokens = line.split()
+            if not tokens:
+                continue
+            command, args = tokens[0], tokens[1:]
+            if command == 'quit':
+                break
+            handler = getattr(self, f'cmd_{command}', None)
+            if handler:
+                handler(args)
+        self.cmd_stop([])
+
+    def cmd_jgi(self, args):
+        self.send(f'id name {self.name}')
+        self.send(f'id author {self.author}')
+        self.send('jgiok')
+
+    def cmd_isready(self, args):
+        self.send('readyok')
+
+    def cmd_setoption(self, args):
+        self.cmd_stop([])
+        if args[:1] != ['name'] or 'value' not in args:
+            return
+        i = args.index('value')
+        name, value = ' '.join(args[1:i]), ' '.join(args[i+1:])
+        if name == 'Cache':
+            if self.player.cache is not None:
+                self.player.cache.close()
+            self.player.cache = None
+            try:
+                self.player.cache = AnalysisCache(value) if value else None
+            except sqlite3.Error as exc:  # keep playing, just without a cache
+                self.send(f'info string cache not opened: {exc!r}')
+        elif name == 'MaxDepth' and value.isdigit():
+            self.player.max_depth = int(value)
+
+    def cmd_newgame(self, args):
+        self.cmd_stop([])
+        self.player.new_game()
+
+    def cmd_position(self, args):
+        self.cmd_stop([])
+        if 'moves' in args:
+            i = args.index('moves')
+            args, moves = args[:i], args[i+1:]
+        else:
+            moves = []
+
+        if args[:1] == ['startpos']:
+            self.game.reset()
+        elif args[:1] == ['fen']:
+            try:
+                self.game.set_fen(' '.join(args[1:]))
+            except ValueError:  # bad input is ignored
+                return
+        else:
+            return
+
+        for move in moves:
+            step = self.game.step_from_str(move)
+            if not step:
+                break
+            self.game.step(*step)
+
+    def cmd_go(self, args):
+        self.cmd_stop([])
+        self.pondering = 'ponder' in args
+        args = [arg for arg in args if arg != 'ponder']
+        # name value pairs, non-integer values are ignored
+        opts = {name: int(value) for name, value in zip(args[::2], args[1::2])
+                if value.isdigit()}
+        depth = opts.get('depth')
+        self.movetime = opts.get('movetime')
+        self.ponder_done.clear()
+        # while pondering the clock is not ours: no movetime until ponderhit.
+        # Armed here, so a stop / ponderhit right after go is never lost
+        self.player.prepare(None if self.pondering else self.movetime)
+        self.thread = threading.Thread(target=self._search, args=(depth,), daemon=True)
+        self.thread.start()
+
+    def cmd_ponderhit(self, args):
+        if self.pondering:
+            self.pondering = False
+            if self.movetime:
+                self.player.deadline = self._deadline(self.movetime)
+            self.ponder_done.set()
+
+    def cmd_stop(self, args):
+        if self.thread is not None:
+            self.player.stop()
+            self.ponder_done.set()
+            self.thread.join()
+            self.thread = None
+
+    def _deadline(self, movetime):
+        return time.monotonic() + movetime / 1000
+
+    def _info(self, depth, score, nodes, pv):
+        self.send(f'info depth {depth} score {score} nodes {nodes} pv {" ".join(pv)}')
+
+    def _search(self, depth):
+        # whatever happens, the GUI gets its bestmove
+        step, pv = None, []
+        try:
+            game = Janggi()
+            game.set_fen(self.game.fen())
+            step, score, pv = self.player.search(game, depth=depth, info=self._info, prepared=True)
+        except Exception as exc:
+            self.send(f'info string search failed: {exc!r}')
+        # a finished ponder search waits to be told what happened
+        if self.pondering:
+            self.ponder_done.wait()
+        if step is None:
+            self.send('bestmove (none)')
+        elif len(pv) > 1:
+            self.send(f'bestmove {step} ponder {pv[1]}')
+        else:
+            self.send(f'bestmove {step}')
+
+
+
+class EngineProcess:
+    """
+    An engine (ours by default, or any command speaking the protocol)
+    running as a subprocess
+    """
+
+    default_command = (sys.executable, '-u', __file__)
+
+    def __init__(self, command=None, options=None, timeout=60):
+        self.command = list(command or self.default_command)
+        self.timeout = timeout  # seconds without a line before giving up
+        self.proc = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, text=True, bufsize=1)
+        # lines are read by a thread, so that reads can time out
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_lines, daemon=True).start()
+        try:
+            self.send('jgi')
+            self.name = None
+            for line in self.read_until('jgiok'):
+                if line.startswith('id name '):
+                    self.name = line[len('id name '):]
+            for name, value in (options or {}).items():
+                self.send(f'setoption name {name} value {value}')
+        except EngineError:
+            self.proc.kill()
+            raise
+
+    def _read_lines(self):
+        for line in self.proc.stdout:
+            self.lines.put(line)
+        self.lines.put(None)  # eof
+
+    def send(self, line):
+        try:
+            self.proc.stdin.write(line + '\n')
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise EngineError(f'engine {self.command} is gone')
+
+    def read_line(self):
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            raise EngineError(f'engine {self.command} silent for {self.timeout}s')
+        if line is None:
+            self.lines.put(None)  # eof for any later read too
+            raise EngineError(f'engine {self.command} exited ({self.proc.poll()})')
+        return line.strip()
+
+    def read_until(self, prefix):
+        # lines up to (including) the first starting with prefix
+        while True:
+            line = self.read_line()
+            yield line
+            if line.startswith(prefix):
+                return
+
+    def set_position(self, fen=None, moves=()):
+        position = f'fen {fen}' if fen else 'startpos'
+        if moves:
+            position += ' moves ' + ' '.join(moves)
+        self.send(f'position {position}')
+
+    def go(self, depth=None, movetime=None, ponder=False):
+        args = []
+        if depth:
+            args += ['depth', str(depth)]
+        if movetime:
+            args += ['movetime', str(movetime)]
+        if ponder:
+            args.append('ponder')
+        self.send(' '.join(['go'] + args))
+
+    def read_analysis(self):
+        # consume info lines up to bestmove
+        score, depth, pv = 0, 0, []
+        for line in self.read_until('bestmove'):
+            tokens = line.split()
+            if tokens[:1] == ['info'] and 'string' not in tokens[1:2]:
+                opts = dict(zip(tokens[1::2], tokens[2::2]))
+                try:
+                    depth = int(opts.get('depth', depth))
+                    score = int(opts.get('score', score))
+                except ValueError:
+                    pass
+                if 'pv' in tokens:
+                    pv = tokens[tokens.index('pv')+1:]
+        bestmove = tokens[1] if len(tokens) > 1 and tokens[1] != '(none)' else None
+        ponder = tokens[3] if len(tokens) > 3 and tokens[2] == 'ponder' else None
+        return Analysis(bestmove, ponder, score, depth, pv)
+
+    def analyse(self, fen=None, moves=(), depth=None, movetime=None):
+        self.set_position(fen, moves)
+        self.go(depth, movetime)
+        return self.read_analysis()
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def close(self):
+        if self.alive():
+            try:
+                self.send('quit')
+                self.proc.wait(timeout=1)
+            except (EngineError, subprocess.TimeoutExpired):
+                self.proc.kill()
+        self.proc.wait()
+
+
+
+class EnginePool:
+    """
+    Warm pool of engine processes, each request goes to an idle one
+    """
+
+    def __init__(self, size=2, command=None, options=None):
+        # options: sent to every engine, e.g. {'Cache': 'analysis.db'}
+        self.command, self.options = command, options
+        self.engines = [EngineProcess(command, options) for _ in range(size)]
+        self.idle = queue.Queue()
+        for engine in self.engines:
+            self.idle.put(engine)
+        self.executor = ThreadPoolExecutor(max_workers=size)
+
+    def analyse(self, fen=None, moves=(), depth=None, movetime=None):
+        # blocks until an engine is idle and has answered
+        engine = self.idle.get()
+        try:
+            if engine is None or not engine.alive():  # died while idle
+                engine = self._respawn(engine)
+                if engine is None:
+                    raise EngineError(f'engine {self.command} does not start')
+            return engine.analyse(fen, moves, depth, movetime)
+        except Exception:
+            # crashed or out of sync: never hand it out again
+            engine = self._respawn(engine)
+            raise
+        finally:
+            self.idle.put(engine)  # None: respawned on next use
+
+    def _respawn(self, engine):
+        # replace engine so the pool stays warm; None if that fails too
+        if engine is not None:
+            engine.close()
+            self.engines.remove(engine)
+        try:
+            engine = EngineProcess(self.command, self.options)
+        except (EngineError, OSError):
+            return None
+        self.engines.append(engine)
+        return engine
+
+    def submit(self, fen=None, moves=(), depth=None, movetime=None):
+        # non-blocking: returns a concurrent.futures.Future of Analysis
+        return self.executor.submit(self.analyse, fen, moves, depth, movetime)
+
+    def close(self):
+        self.executor.shutdown()
+        for engine in self.engines:
+            engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+class EngineOpponent:
+    """
+    Drives an EngineProcess from a background thread, so a UI loop never
+    waits on it: request() returns at once, poll() each frame for the answer.
+    Between requests the engine ponders on the expected reply
+    """
+
+    def __init__(self, movetime=1000, command=None, options=None):
+        self.movetime = movetime
+        self.command, self.options = command, options
+        self.future = None
+        self._start()
+
+    def _start(self):
+        # all engine i/o happens in this single worker, in order
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.engine = self.executor.submit(EngineProcess, self.command, self.options)
+        self.pondering = None  # steps of the position pondered on (worker only)
+
+    def restart(self):
+        self.close(wait=False)
+        self._start()
+
+    def new_game(self):
+        self.future = None
+        self.executor.submit(self._new_game, self.engine)
+
+    def request(self, steps):
+        # think on the position after steps (from startpos)
+        self.future = self.executor.submit(self._think, self.engine, list(steps))
+
+    def ponder(self, steps, expected):
+        # think on the position after steps + [expected] until request()
+        self.executor.submit(self._ponder, self.engine, list(steps) + [expected])
+
+    def poll(self):
+        # Analysis once the requested search is over, else None.
+        # Raises EngineError if the engine failed meanwhile
+        if self.future is not None and self.future.done():
+            future, self.future = self.future, None
+            try:
+                return future.result()
+            except EngineError:
+                raise
+            except Exception as exc:  # e.g. the engine could not be started
+                raise EngineError(f'engine {self.command} failed: {exc!r}') from exc
+        return None
+
+    def thinking(self):
+        return self.future is not None
+
+    def close(self, wait=True):
+        # wait=False: give up on the engine at once, whatever it is doing
+        self.future = None
+        if wait:
+            self.executor.submit(self._close, self.engine)
+            self.executor.shutdown()
+        else:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            threading.Thread(target=self._close, args=(self.engine,), daemon=True).start()
+
+    # worker side: each call gets the engine it was submitted for, so that
+    # leftovers of an engine given up by restart() cannot touch the new one
+
+    def _set_pondering(self, engine, steps):
+        if engine is self.engine:
+            self.pondering = steps
+
+    def _stop_ponder(self, engine):
+        if self.pondering is not None and engine is self.engine:
+            self.pondering = None
+            engine.result().send('stop')
+            engine.result().read_analysis()
+
+    def _new_game(self, engine):
+        self._stop_ponder(engine)
+        engine.result().send('newgame')
+
+    def _think(self, engine, steps):
+        if self.pondering == steps and engine is self.engine:  # expected reply: search is warm
+            self._set_pondering(engine, None)
+            engine.result().send('ponderhit')
+            return engine.result().read_analysis()
+        self._stop_ponder(engine)
+        return engine.result().analyse(moves=steps, movetime=self.movetime)
+
+    def _ponder(self, engine, steps):
+        self._stop_ponder(engine)
+        engine.result().set_position(moves=steps)
+        engine.result().go(movetime=self.movetime, ponder=True)
+        self._set_pondering(engine, steps)
+
+    def _close(self, engine):
+        try:
+            engine.result().close()  # 'quit' stops any pondering too
+        except Exception:  # never started, or already gone
+            pass
+
+
+
+if __name__ == '__main__':
+    Engine().run()
@@ -1,14 +1,17 @@
 from enum import IntEnum
+from collections import Counter
 from compass import Compass
 
 
 class Graph:
 
     compass = Compass
+    _neighbor_indexes = {}  # all_nodes() -> neighbor index, shared by instances
 
     def __init__(self, all_nodes, all_markers):
         self.at_node   = {node: set() for node in all_nodes}  # marker at?
         self.wh_marker = {marker: None for marker in all_markers}  # where marker?
+        self.neighbors = self._index_neighbors()  # node -> direction code -> node
         self.saved = {}
         self.save('empty')
 
@@ -18,6 +21,35 @@ class Graph:
     def all_markers(self):
         return frozenset(self.wh_marker.keys())
 
+    def _index_neighbors(self):
+        # built once per set of nodes; only (x, y) nodes have neighbors
+        nodes = self.all_nodes()
+        if nodes not in Graph._neighbor_indexes:
+            deltas = [(self.compass.code(d), self.compass.xy(d)) for d in self.compass]
+            index = {}
+            for node in nodes:
+                index[node] = {}
+                if isinstance(node, tuple) and len(node) == 2:
+                    for code, (dx, dy) in deltas:
+                        neighbor = (node[0] + int(dx), node[1] + int(dy))
+                        if neighbor in nodes:
+                            index[node][code] = neighbor
+            Graph._neighbor_indexes[nodes] = index
+        return Graph._neighbor_indexes[nodes]
+
+    def neighbor(self, node, code):
+        # node next to node in direction code (see Compass.code), if any
+        return self.neighbors[node].get(code)
+
+    def move_table(self, patterns):
+        # {marker: directions} -> {marker: {node: reachable neighbor nodes}}
+        table = {}
+        for marker, directions in patterns.items():
+            codes = [self.compass.code(d) for d in directions]
+            table[marker] = {node: tuple(adj[code] for code in codes if code in adj)
+                             for node, adj in self.neighbors.items()}
+        return table
+
     def _infer_nodes(self):
         # sync with markers
         at_node = {node: set() for node in self.all_nodes()}
@@ -71,6 +103,24 @@ class Janggi(Graph):
 
     Piece = IntEnum('Piece', 'KING GENERAL MINISTER MAN FEUDAL_LORD')
 
+    # position / move notation (uppercase is '+', lowercase is '-')
+    letters = {
+        Piece.KING: 'K',
+        Piece.GENERAL: 'G',
+        Piece.MINISTER: 'M',
+        Piece.MAN: 'P',
+        Piece.FEUDAL_LORD: 'F',
+    }
+
+    # material (pools included: a captured piece changes sides)
+    values = {
+        Piece.KING: 0,  # losing it ends the game
+        Piece.GENERAL: 5,
+        Piece.MINISTER: 3,
+        Piece.MAN: 1,
+        Piece.FEUDAL_LORD: 4,
+    }
+
     def __init__(self):
         self.cols, self.rows = 4, 3
         self.min_x, self.max_x = 0, self.cols-1
@@ -98,6 +148,10 @@ class Janggi(Graph):
 
         super().__init__(nodes, pieces)
 
+        # piece -> node -> nodes it attacks from there (occupied or not)
+        self.attack_table = self.move_table(self.movement_patterns)
+        self._infer_stats()
+
     def reset(self):
         if 'reset' not in self.saved:
             self.load('empty')
@@ -116,6 +170,55 @@ class Janggi(Graph):
         self.winner = None
         self.load('reset')
 
+    def load(self, record):
+        super().load(record)
+        self._infer_stats()
+
+    def _place_marker(self, marker, node):
+        super()._place_marker(marker, node)
+        self._track(marker, +1)
+
+    def _infer_stats(self):
+        # from scratch; step() keeps them up to date from here on
+        self.attacks = {player: {node: 0 for node in self.board_nodes()}
+                        for player in self.players}
+        self.material = {player: 0 for player in self.players}
+        self.king_dist = {player: None for player in self.players}
+        for marker, node in self.wh_marker.items():
+            if node is not None:
+                self._track(marker, +1)
+
+    def _track(self, marker, sign):
+        # add (+1) / remove (-1) marker's share of attacks, material, king_dist
+        node = self.wh_marker[marker]
+        player = self._owner(marker)
+        piece = self.Piece(abs(int(marker)))
+        self.material[player] += sign * self.values[piece]
+        if node in self.pl_pools:
+            return
+        attacks = self.attacks[player]
+        for dest in self.attack_table[int(marker)][node]:
+            attacks[dest] += sign
+        if piece == self.Piece.KING:
+            goal = self.max_x if player < 0 else self.min_x
+            self.king_dist[player] = abs(goal - node[0]) if sign > 0 else None
+
+    def attackers(self, node, player):
+        # how many of player's pieces could step onto node
+        return self.attacks[player][node]
+
+    def material_balance(self, player):
+        return self.material[player] - self.material[-player]
+
+    def king_distance(self, player):
+        # columns left to the opponent's side (None if captured)
+        return self.king_dist[player]
+
+    def king_threatened(self, player):
+        # is player's king capturable on the opponent's next step?
+        king = self.wh_marker.get(player * self.Piece.KING)
+        return self._in_bounds(king) and bool(self.attacks[-player][king])
+
     @property
     def cur_player(self):
         return self.players[int(self.turn + 1) % 2]
@@ -142,21 +245,16 @@ class Janggi(Graph):
             return True
 
     def _valid_move(self, marker, dest):
-        x, y = 0, 1
         orig = self.wh_marker[marker]
-        delta = (dest[x] - orig[x], dest[y] - orig[y])
-
-        if abs(delta[x]) <= 1 and abs(delta[y]) <= 1:
-            unit_delta = (0 if delta[x] == 0 else (1 if delta[x] > 0 else -1),
-                          0 if delta[y] == 0 else (1 if delta[y] > 0 else -1))
-            direction = self.compass.from_xy(unit_delta)
-            return (direction in self.movement_patterns[int(marker)])
-
-        return False
+        return (dest in self.attack_table[int(marker)][orig])
 
     def _in_bounds(self, node):
         return (node in self.at_node and node not in self.pl_pools)
 
+    def board_nodes(self):
+        return [(x, y) for y in range(self.min_y, self.max_y+1)
+                       for x in range(self.min_x, self.max_x+1)]
+
     def is_step_valid(self, marker, dest):
         assert not self.winner, 'winner. game must be reset() first'
 
@@ -173,6 +271,33 @@ class Janggi(Graph):
 
         return False
 
+    def valid_steps(self):
+        # all (marker, dest) the current player may step()
+        steps = []
+        if self.winner:
+            return steps
+
+        board = self.board_nodes()
+        dropped = set()
+        for marker, orig in list(self.wh_marker.items()):
+            if orig is None or self._owner(marker) != self.cur_player:
+                continue
+
+            if orig in self.pl_pools:  # drops (once per piece type)
+                if int(marker) in dropped:
+                    continue
+                dropped.add(int(marker))
+                for dest in board:
+                    if self._not_occupied(dest) and not self._in_opp_terr(dest, marker):
+                        steps.append((marker, dest))
+
+            else:  # movements
+                for dest in self.attack_table[int(marker)][orig]:
+                    if self._not_ally(dest, marker):
+                        steps.append((marker, dest))
+
+        return steps
+
     def step(self, marker, dest):
         assert self.is_step_valid(marker, dest)
 
@@ -183,6 +308,7 @@ class Janggi(Graph):
             pl = self.players.index(player_marker)
             capture, = self.at_node[dest]
             capture_dest = self.pl_pools[pl]
+            self._track(capture, -1)
             self._move_marker(capture, capture_dest)
             piece = self.Piece(abs(int(capture)))
             if piece == self.Piece.KING:
@@ -201,10 +327,13 @@ class Janggi(Graph):
             self.wh_marker[capture] = None
             self.at_node[capture_dest].add(capt)
             self.wh_marker[capt] = capture_dest
+            self._track(capt, +1)
 
         # execute movement
         orig = self.wh_marker[marker]
+        self._track(marker, -1)
         self._move_marker(marker, dest)
+        self._track(marker, +1)
 
         # promotion
         piece = self.Piece(abs(int(marker)))
@@ -219,14 +348,125 @@ class Janggi(Graph):
                         new_marker = int(new_marker)
                     else:
                         new_marker = float_marker
+                self._track(marker, -1)
                 self.at_node[dest].remove(marker)
                 self.wh_marker[marker] = None
                 self.at_node[dest].add(new_marker)
                 self.wh_marker[new_marker] = dest
+                self._track(new_marker, +1)
 
         self.turn += 1
         return self.winner
 
+    def snapshot(self):
+        # cheaper than save() for search: also keeps turn, winner and stats
+        return (self.wh_marker.copy(), self.turn, self.winner,
+                {player: attacks.copy() for player, attacks in self.attacks.items()},
+                self.material.copy(), self.king_dist.copy())
+
+    def restore(self, snapshot):
+        wh_marker, self.turn, self.winner, attacks, material, king_dist = snapshot
+        self.wh_marker = wh_marker.copy()
+        self.at_node = self._infer_nodes()
+        self.attacks = {player: attacks.copy() for player, attacks in attacks.items()}
+        self.material = material.copy()
+        self.king_dist = king_dist.copy()
+
+    def _letter(self, marker):
+        letter = self.letters[self.Piece(abs(int(marker)))]
+        return letter if marker > 0 else letter.lower()
+
+    def _from_letter(self, letter):
+        piece = next(p for p, l in self.letters.items() if l == letter.upper())
+        return +piece if letter.isupper() else -piece
+
+    def _square(self, node):
+        # files a, b, ... from left; ranks 1, 2, ... from top
+        x, y = node
+        return f'{chr(ord("a") + x - self.min_x)}{y - self.min_y + 1}'
+
+    def _node(self, square):
+        if len(square) != 2:
+            raise ValueError(f'invalid square: {square!r}')
+        node = (ord(square[0]) - ord('a') + self.min_x, int(square[1]) - 1 + self.min_y)
+        if not self._in_bounds(node):
+            raise ValueError(f'invalid square: {square!r}')
+        return node
+
+    def fen(self):
+        # e.g. 'm..G/kpPK/g..M - g': rows top to bottom, pools, side to move
+        rows = []
+        for y in range(self.min_y, self.max_y + 1):
+            row = [self.at_node[(x, y)] for x in range(self.min_x, self.max_x + 1)]
+            rows.append(''.join(self._letter(next(iter(node))) if node else '.' for node in row))
+        pools = sorted(self._letter(m) for pool in self.pl_pools for m in self.at_node[pool])
+        side = 'g' if self.cur_player > 0 else 'r'
+        return f'{"/".join(rows)} {"".join(pools) or "-"} {side}'
+
+    def set_fen(self, fen):
+        try:
+            board, pools, side = fen.split()
+            rows = board.split('/')
+            assert len(rows) == self.rows and all(len(row) == self.cols for row in rows)
+            assert side in ('g', 'r')
+            pieces = [(self._from_letter(letter), (self.min_x + x, self.min_y + y))
+                      for y, row in enumerate(rows)
+                      for x, letter in enumerate(row) if letter != '.']
+            if pools != '-':
+                for letter in pools:
+                    piece = self._from_letter(letter)
+                    pieces.append((piece, self.pl_pools[int(piece > 0)]))
+            # two markers per piece and side at most (see step)
+            assert max(Counter(piece for piece, _ in pieces).values(), default=0) <= 2
+            # one king per side: on board, or captured into the opponent's pool
+            kings = Counter(piece if node not in self.pl_pools else -piece
+                            for piece, node in pieces if abs(piece) == self.Piece.KING)
+            assert max(kings.values(), default=0) <= 1
+        except (AssertionError, StopIteration, ValueError):
+            raise ValueError(f'invalid fen: {fen!r}')
+
+        self.load('empty')
+        for piece, node in pieces:
+            # duplicates are told apart by a 0.1 offset (as in step)
+            marker = piece
+            if self.wh_marker.get(marker) is not None:
+                marker = piece + 0.1 if piece > 0 else piece - 0.1
+            self.wh_marker.setdefault(marker, None)
+            self._place_marker(marker, node)
+
+        self.turn = 0 if side == 'g' else 1
+        self.winner = None
+        for player in self.players:
+            king = self.wh_marker.get(player * self.Piece.KING)
+            if king is None or king in self.pl_pools:
+                self.winner = -player
+            elif self._in_opp_terr(king, player):
+                self.winner = player
+
+    def step_to_str(self, marker, dest):
+        # 'b2c2' for movements, 'P*c1' for drops from pool
+        orig = self.wh_marker[marker]
+        if orig in self.pl_pools:
+            return f'{self._letter(abs(marker))}*{self._square(dest)}'
+        return self._square(orig) + self._square(dest)
+
+    def step_from_str(self, text):
+        # (marker, dest) if text is a valid step else False
+        if self.winner:
+            return False
+        try:
+            if text[1:2] == '*':
+                piece = self._from_letter(text[0].upper()) * self.cur_player
+                pool = self.pl_pools[self.players.index(self.cur_player)]
+                marker = next(m for m in self.at_node[pool] if int(m) == piece)
+                dest = self._node(text[2:])
+            else:
+                marker, = self.at_node[self._node(text[:2])]
+                dest = self._node(text[2:])
+        except (StopIteration, ValueError):
+            return False
+        return self.is_step_valid(marker, dest)
+
     def print_board(self):
         n = 3
         empty = '.' * (n + 1)
@@ -1,33 +1,52 @@
+import sys
 import pygame
 from pygame import Surface, Rect, Color
 from collections import namedtuple
 from app import App
 from compass import Compass
 from janggi import Janggi
+from engine import EngineOpponent, EngineError
 
 
 class JanggiGame(App):
     """
-    Janggi 4x3 in local multiplayer
+    Janggi 4x3 in local multiplayer, or against the computer (ai_player)
     """
 
     config = dict(
         SIZE = (600, 600),
         TITLE = "Janggi",
+        AI_MOVETIME = 1000,  # ms
+        AI_RETRIES = 3,  # engine restarts before falling back to local play
     )
 
-    def __init__(self, *args, **kw):
+    def __init__(self, *args, ai_player=None, **kw):
         super().__init__(*args, **kw)
         self.game = Janggi()
+        self.steps = []  # played so far, as in Janggi.step_to_str
+        self.ai_player = ai_player
+        self.ai = EngineOpponent(self.config['AI_MOVETIME']) if ai_player else None
+        self.ai_failures = 0
         self.init_ui()
 
     def setup(self):
         self.game.reset()
+        self.steps = []
+        self.ui.message = None
+        self.ai_failures = 0
+        if self.ai:
+            self.ai.new_game()
+            if self.game.cur_player == self.ai_player:
+                self.ai.request(self.steps)
+
+    def teardown(self):
+        if self.ai:
+            self.ai.close()
 
     def listen(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_r:
-                self.game.reset()
+                self.setup()
         elif event.type == pygame.MOUSEBUTTONDOWN:
             self._start_drag()
         elif event.type == pygame.MOUSEBUTTONUP:
@@ -79,14 +98,65 @@ class JanggiGame(App):
 
     def update(self, dt):
         # DEBUG: pygame.display.set_caption(f'{self.ui.sel_marker}, {self.ui.sel_dest}')
+        # computer's turn: never wait, just check whether it is done
+        if self.ai and self.game.cur_player == self.ai_player:
+            # dragging is fine meanwhile, dropping is not
+            if self.ui.sel_dest:
+                self.ui.sel_marker = self.ui.sel_dest = None
+            self._update_ai()
+            return
         # try to perform step
         if not self.game.winner and self.ui.sel_marker and self.ui.sel_dest:
             # reset selections
             marker, self.ui.sel_marker = self.ui.sel_marker, None
             dest, self.ui.sel_dest = self.ui.sel_dest, None
-            # check validity and step() only if valid
-            if self.game.is_step_valid(marker, dest):
-                self.game.step(marker, dest)
+            # check validity and step() only if valid (and still in play)
+            if self.game.wh_marker.get(marker) is not None and self.game.is_step_valid(marker, dest):
+                self._step(marker, dest)
+                if self.ai and not self.game.winner:
+                    self.ai.request(self.steps)
+
+    def _step(self, marker, dest):
+        self.steps.append(self.game.step_to_str(marker, dest))
+        self.game.step(marker, dest)
+
+    def _update_ai(self):
+        try:
+            analysis = self.ai.poll()
+        except EngineError as exc:
+            self._ai_failed(exc)
+            return
+        if analysis is None or self.game.winner:
+            return
+
+        step = analysis.bestmove and self.game.step_from_str(analysis.bestmove)
+        if not step:
+            if not self.game.valid_steps():  # nothing to play: R to restart
+                self.ui.message = 'no step left, R to restart'
+            else:
+                self._ai_failed(f'engine played {analysis.bestmove or "nothing"}')
+            return
+
+        self.ai_failures = 0
+        self._step(*step)
+        # the piece being dragged may just have been captured
+        if self.game.wh_marker.get(self.ui.sel_marker) is None:
+            self.ui.sel_marker = self.ui.sel_dest = None
+        # ponder on the human's time
+        if not self.game.winner and analysis.ponder:
+            self.ai.ponder(self.steps, analysis.ponder)
+
+    def _ai_failed(self, reason):
+        # restart the engine and ask again, or give up and play locally
+        self.ai_failures += 1
+        if self.ai_failures > self.config['AI_RETRIES']:
+            self.ai.close(wait=False)
+            self.ai = None
+            self.ui.message = f'computer unavailable ({reason}), local play'
+        else:
+            self.ui.message = f'computer restarted ({reason})'
+            self.ai.restart()
+            self.ai.request(self.steps)
 
     def init_ui(self):
 
@@ -96,6 +166,7 @@ class JanggiGame(App):
         class UI:
             sel_marker = None
             sel_dest   = None
+            message    = None
             assets = Assets()
 
         self.ui = UI()
@@ -302,11 +373,18 @@ class JanggiGame(App):
         font = pygame.font.SysFont('Arial', 24, bold=True)
         player = 'GREEN' if self.game.cur_player > 0 else 'RED'
         color = Color('#244f21') if self.game.cur_player > 0 else Color('#75131c')
-        text = font.render(f'{player} turn', True, color)
+        thinking = self.ai and self.ai.thinking()
+        text = font.render(f'{player} thinking...' if thinking else f'{player} turn', True, color)
         rect = text.get_rect(center=self.ui.assets.board.rect.center)
         rect.bottom = self.ui.assets.board.rect.y * 75//100
         screen.blit(text, rect)
 
+        # computer trouble, if any
+        if self.ui.message:
+            font = pygame.font.SysFont('Arial', 16)
+            text = font.render(self.ui.message, True, Color('black'))
+            screen.blit(text, text.get_rect(midtop=(self.window.centerx, 4)))
+
         # in bounds
         bx, by, bw, bh = self.ui.assets.board.rect
         qw, qh = self.ui.assets.board.quadrant.rect.size
@@ -356,4 +434,5 @@ class JanggiGame(App):
 
 
 if __name__ == '__main__':
-    JanggiGame().run()
+    # --ai: play GREEN against the computer
+    JanggiGame(ai_player=-1 if '--ai' in sys.argv else None).run()
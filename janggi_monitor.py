@@ -0,0 +1,163 @@
+import os
+import math
+import queue
+import random
+import multiprocessing
+import pygame
+from pygame import Surface, Rect, Color
+from collections import namedtuple
+from janggi_game import JanggiGame
+from search import SearchPlayer, self_play
+
+
+TileAssets = namedtuple('TileAssets', 'background board_rect quad pieces pool_pieces')
+
+
+class JanggiMonitor(JanggiGame):
+    """
+    Many live games tiled in one window, fed (game_id, fen) updates
+    through a queue (e.g. by self_play_worker processes)
+    """
+
+    config = dict(
+        SIZE = (1200, 900),
+        TITLE = "Janggi monitor",
+        MAX_UPDATES = 1000,  # queue items handled per frame
+    )
+
+    def __init__(self, updates, n_games, *args, **kw):
+        super().__init__(*args, **kw)
+        self.updates = updates
+        self.n_games = n_games
+        self.fens = {}   # game_id -> latest fen
+        self.dirty = set()  # game_ids to redraw
+        self.dirty_rects = []
+        self.tile_assets = {}  # (w, h) -> TileAssets
+        self._layout()
+
+    def _layout(self):
+        grid_cols = math.ceil(math.sqrt(self.n_games))
+        grid_rows = math.ceil(self.n_games / grid_cols)
+        tile_w, tile_h = self.WIDTH // grid_cols, self.HEIGHT // grid_rows
+        self.tiles = [Rect((i % grid_cols) * tile_w, (i // grid_cols) * tile_h, tile_w, tile_h)
+                      for i in range(self.n_games)]
+
+    def setup(self):
+        self.screen.fill(Color('#91464a'))
+        self.dirty_rects = [self.window]
+        self.dirty = set(self.fens)
+
+    def listen(self, event):
+        pass
+
+    def update(self, dt):
+        # never block: take what is there
+        for _ in range(self.config['MAX_UPDATES']):
+            try:
+                game_id, fen = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if self.fens.get(game_id) != fen and 0 <= game_id < self.n_games:
+                self.fens[game_id] = fen
+                self.dirty.add(game_id)
+
+    def draw(self, screen):
+        for game_id in self.dirty:
+            rect = self.tiles[game_id]
+            self._draw_tile(screen, rect, self.fens[game_id])
+            self.dirty_rects.append(rect)
+        self.dirty.clear()
+
+    def present(self):
+        if self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
+    def _get_tile_assets(self, size):
+        # one scaled sprite set and static board per tile size
+        if size in self.tile_assets:
+            return self.tile_assets[size]
+
+        board = self.ui.assets.board
+        tile_w, tile_h = size
+        rows, cols = self.game.rows, self.game.cols
+        quad = min(tile_w // cols, (tile_h - 4) // (rows + 1))  # + a row for pools
+        board_rect = Rect((tile_w - cols * quad) // 2, (tile_h - (rows + 1) * quad) // 2,
+                          cols * quad, rows * quad)
+
+        background = Surface(size)
+        background.fill(Color('#91464a'))
+        background.blit(pygame.transform.smoothscale(board.static_surf, board_rect.size), board_rect)
+
+        piece_w = quad * 78//100
+        pool_w = quad // 2
+        pieces, pool_pieces = {}, {}
+        for piece, surf in board.piece.by_id.items():
+            pieces[piece] = pygame.transform.smoothscale(surf, (piece_w, piece_w))
+            pool_surf = pygame.transform.smoothscale(surf, (pool_w, pool_w))
+            pool_pieces[piece] = pygame.transform.rotate(pool_surf, 270 if piece > 0 else 90)
+
+        assets = TileAssets(background.convert(), board_rect, quad, pieces, pool_pieces)
+        self.tile_assets[size] = assets
+        return assets
+
+    def _draw_tile(self, screen, rect, fen):
+        assets = self._get_tile_assets(rect.size)
+        screen.blit(assets.background, rect)
+        self.game.set_fen(fen)
+
+        # in bounds
+        bx, by = rect.x + assets.board_rect.x, rect.y + assets.board_rect.y
+        q = assets.quad
+        for node in self.game.board_nodes():
+            if self.game.at_node[node]:
+                piece, = self.game.at_node[node]
+                ix, iy = node
+                surf = assets.pieces[int(piece)]
+                screen.blit(surf, surf.get_rect(center=(bx + ix * q + q // 2, by + iy * q + q // 2)))
+
+        # out pools (two rows of half-size pieces under each half of the board)
+        pool_y = by + assets.board_rect.height
+        half_w = assets.board_rect.width // 2
+        per_row = max(1, half_w // (q // 2))
+        for pl, pool_nd in enumerate(self.game.pl_pools):
+            for i, piece in enumerate(sorted(self.game.at_node[pool_nd])[:2 * per_row]):
+                x = bx + pl * half_w + (i % per_row) * (q // 2)
+                y = pool_y + (i // per_row) * (q // 2)
+                screen.blit(assets.pool_pieces[int(piece)], (x, y))
+
+        # game over
+        if self.game.winner:
+            color = Color('#244f21') if self.game.winner > 0 else Color('#75131c')
+            pygame.draw.rect(screen, color, rect, 3)
+
+
+
+def self_play_worker(game_ids, updates, depth=3, seed=None):
+    # plays its games in turns, one step each, forever
+    rng = random.Random(seed)
+    player = SearchPlayer()
+    games = {}
+    while True:
+        for game_id in game_ids:
+            if game_id not in games:
+                games[game_id] = self_play(player, depth=depth, rng=rng)
+            fen = next(games[game_id], None)
+            if fen is None:  # game over: next one
+                player.new_game()
+                del games[game_id]
+            else:
+                updates.put((game_id, fen))
+
+
+
+if __name__ == '__main__':
+    n_games = 36
+    n_workers = min(os.cpu_count() or 1, n_games)
+    updates = multiprocessing.Queue(maxsize=4 * n_games)
+    workers = [multiprocessing.Process(target=self_play_worker, args=(range(i, n_games, n_workers), updates),
+                                       kwargs=dict(seed=i), daemon=True)
+               for i in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    JanggiMonitor(updates, n_games).run()
@@ -0,0 +1,245 @@
+import os
+import sys
+import random
+import argparse
+import threading
+import multiprocessing
+from janggi import Janggi
+from search import SearchPlayer, self_play
+
+
+class PuzzleSolver:
+    """
+    Forced wins (king capture or king reaching the opponent's side)
+    for the player to move, within a number of plies
+    """
+
+    def __init__(self, max_plies=5, min_plies=3):
+        self.max_plies = max_plies  # odd: the winner moves first and last
+        self.min_plies = min_plies  # below that it is no puzzle
+        self.game = Janggi()
+        self.memo = {}  # (fen, plies, attacking) -> bool, per position
+
+    def solve(self, fen):
+        # (fen, plies, step) if the fewest plies win has a single winning
+        # step at every ply of the winner, whatever the defence, but the last
+        self.game.set_fen(fen)
+        if self.game.winner:
+            return None
+        self.memo.clear()
+        plies, winning = self._fastest_win(self.max_plies)
+        if plies >= self.min_plies and self._unique(plies, winning):
+            return fen, plies, winning[0]
+        return None
+
+    def _fastest_win(self, max_plies):
+        # (plies, winning step strs) of the fewest plies win, or (0, [])
+        for plies in range(1, max_plies + 1, 2):
+            winning = self._winning_steps(plies)
+            if winning:
+                return plies, winning
+        return 0, []
+
+    def _unique(self, plies, winning):
+        # winning: the steps winning in the fewest plies for the player to move
+        if plies == 1:  # the final blow: any will do
+            return True
+        if len(winning) != 1:
+            return False
+        game = self.game
+        snap = game.snapshot()
+        game.step(*game.step_from_str(winning[0]))
+        reply_snap = game.snapshot()
+        unique = True
+        for step in game.valid_steps():
+            game.step(*step)
+            # a forced win: every reply still loses within plies - 2
+            unique = self._unique(*self._fastest_win(plies - 2))
+            game.restore(reply_snap)
+            if not unique:
+                break
+        game.restore(snap)
+        return unique
+
+    def _winning_steps(self, plies):
+        game = self.game
+        snap = game.snapshot()
+        winning = []
+        for marker, dest in game.valid_steps():
+            text = game.step_to_str(marker, dest)
+            game.step(marker, dest)
+            if game.winner or (plies > 1 and not self._defends(plies - 1)):
+                winning.append(text)
+            game.restore(snap)
+        return winning
+
+    def _wins(self, plies):
+        # can the player to move force a win within plies?
+        game = self.game
+        if game.king_threatened(-game.cur_player):  # O(1): capture right away
+            return True
+        if plies <= 0:
+            return False
+        if plies < 3:
+            return game.king_distance(game.cur_player) == 1 and self._any_win_now()
+        key = (game.fen(), plies, True)
+        if key not in self.memo:
+            snap = game.snapshot()
+            result = False
+            for step in game.valid_steps():
+                game.step(*step)
+                result = bool(game.winner) or not self._defends(plies - 1)
+                game.restore(snap)
+                if result:
+                    break
+            self.memo[key] = result
+        return self.memo[key]
+
+    def _any_win_now(self):
+        game = self.game
+        snap = game.snapshot()
+        for step in game.valid_steps():
+            game.step(*step)
+            won = bool(game.winner)
+            game.restore(snap)
+            if won:
+                return True
+        return False
+
+    def _defends(self, plies):
+        # can the player to move hold out for plies (its step included)?
+        game = self.game
+        key = (game.fen(), plies, False)
+        if key not in self.memo:
+            snap = game.snapshot()
+            result = False
+            steps = game.valid_steps()
+            if not steps:  # stuck, but not beaten
+                result = True
+            for step in steps:
+                game.step(*step)
+                result = bool(game.winner) or not self._wins(plies - 1)
+                game.restore(snap)
+                if result:
+                    break
+            self.memo[key] = result
+        return self.memo[key]
+
+
+
+def self_play_positions(seed, depth=3):
+    # fens of one self-play game
+    player = SearchPlayer()
+    return self_play(player, depth=depth, random_plies=4, rng=random.Random(seed))
+
+
+def recorded_positions(line):
+    # fens of one recorded game: steps from startpos, as in Janggi.step_to_str
+    game = Janggi()
+    game.reset()
+    yield game.fen()
+    for text in line.split():
+        step = game.step_from_str(text)
+        if not step:
+            break
+        game.step(*step)
+        yield game.fen()
+
+
+_solver = None
+_seen = set()  # positions this worker already solved (recent ones)
+_max_seen = 0
+
+def _init_worker(max_plies, min_plies, max_seen):
+    global _solver, _max_seen
+    _solver = PuzzleSolver(max_plies, min_plies)
+    _max_seen = max_seen
+
+def _mine_game(game):
+    # game: a seed (self-play) or a line (recorded game), played and solved
+    # right here so every worker is busy all the time
+    fens = self_play_positions(game) if isinstance(game, int) else recorded_positions(game)
+    n_positions, puzzles = 0, []
+    for fen in fens:
+        n_positions += 1
+        if fen in _seen:
+            continue
+        if len(_seen) > _max_seen:
+            _seen.clear()
+        _seen.add(fen)
+        puzzle = _solver.solve(fen)
+        if puzzle:
+            puzzles.append(puzzle)
+    return n_positions, puzzles
+
+
+def mine(games, out, max_plies=5, min_plies=3, processes=None,
+         in_flight=None, max_seen=100000):
+    # games: iterable (streamed) of seeds for self-play and/or lines of
+    # recorded games, out: text file of puzzles. Memory stays bounded by
+    # in_flight games and max_seen positions per worker; puzzles already
+    # in out are skipped, so a run can be resumed
+    processes = processes or os.cpu_count() or 1
+    in_flight = in_flight or 4 * processes
+    written = set()
+    if os.path.exists(out):
+        with open(out) as f:
+            written = {line.split('\t')[0] for line in f if line.strip()}
+
+    slots = threading.BoundedSemaphore(in_flight)
+    counts = {'read': 0, 'found': 0}
+    errors = []
+
+    with open(out, 'a') as f:
+
+        # callbacks all run in the pool's single result thread
+        def done(result):
+            n_positions, puzzles = result
+            counts['read'] += n_positions
+            for fen, plies, step in puzzles:
+                if fen not in written:
+                    written.add(fen)
+                    f.write(f'{fen}\t{plies}\t{step}\n')
+                    counts['found'] += 1
+            f.flush()
+            slots.release()
+
+        def failed(exc):
+            errors.append(exc)
+            slots.release()
+
+        with multiprocessing.Pool(processes, _init_worker,
+                                  (max_plies, min_plies, max_seen // processes)) as pool:
+            for game in games:
+                slots.acquire()
+                if errors:
+                    slots.release()
+                    break
+                pool.apply_async(_mine_game, (game,), callback=done, error_callback=failed)
+            for _ in range(in_flight):  # wait for the last ones
+                slots.acquire()
+
+    if errors:
+        raise errors[0]
+    return counts['read'], counts['found']
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mine Janggi puzzles (forced wins)')
+    parser.add_argument('out', help='puzzle file, one "fen<TAB>plies<TAB>step" per line')
+    parser.add_argument('--games', type=int, default=1000, help='self-play games to mine')
+    parser.add_argument('--record', help='recorded games instead, one per line ("-" for stdin)')
+    parser.add_argument('--plies', type=int, default=5, help='longest forced win searched')
+    parser.add_argument('--min-plies', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.record == '-':
+        n_read, n_found = mine(sys.stdin, args.out, args.plies, args.min_plies, args.processes)
+    elif args.record:
+        with open(args.record) as lines:
+            n_read, n_found = mine(lines, args.out, args.plies, args.min_plies, args.processes)
+    else:
+        n_read, n_found = mine(range(args.games), args.out, args.plies, args.min_plies, args.processes)
+    print(f'{n_read} positions read, {n_found} puzzles found')
@@ -0,0 +1,208 @@
+import time
+import random
+import threading
+from janggi import Janggi
+
+
+class SearchStopped(Exception):
+    pass
+
+
+
+class SearchPlayer:
+    """
+    Alpha-beta (negamax) player with iterative deepening
+    """
+
+    WIN = 10000
+    INF = WIN + 1
+    THREAT = 1000  # can capture the opponent's king right away
+
+    # transposition table flags
+    EXACT, LOWER, UPPER = range(3)
+
+    def __init__(self, max_depth=8, cache=None):
+        self.max_depth = max_depth
+        self.cache = cache  # AnalysisCache shared with other processes, if any
+        self.table = {}  # fen -> (depth, score, flag, step str)
+        self.stop_event = threading.Event()
+        self.deadline = None  # time.monotonic() limit, if any
+        self.nodes = 0
+
+    def new_game(self):
+        self.table.clear()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def evaluate(self, game):
+        # from the point of view of the player to move (O(1) reads only)
+        player = game.cur_player
+        if game.king_threatened(-player):
+            return self.THREAT
+        score = 4 * game.material_balance(player)
+        score += game.king_distance(-player) - game.king_distance(player)
+        return score
+
+    def prepare(self, movetime=None):
+        # arm stop flag and clock before a search; a stop() or deadline set
+        # from now on is kept by search(prepared=True)
+        self.stop_event.clear()
+        self.deadline = time.monotonic() + movetime / 1000 if movetime else None
+
+    def search(self, game, depth=None, movetime=None, info=None, prepared=False):
+        # returns (step str, score, pv) for the player to move in game.
+        # info(depth, score, nodes, pv) is called after each iteration
+        if not prepared:
+            self.prepare(movetime)
+        self.nodes = 0
+
+        key = game.fen()
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached and cached.bestmove and (cached.depth >= (depth or self.max_depth)
+                                               or abs(cached.score) > self.WIN - 100):
+                if info:
+                    info(cached.depth, cached.score, self.nodes, cached.pv)
+                return cached.bestmove, cached.score, cached.pv
+
+        root = game.snapshot()
+        best = None
+        for d in range(1, (depth or self.max_depth) + 1):
+            try:
+                score = self._negamax(game, d, -self.INF, self.INF, 0)
+            except SearchStopped:
+                game.restore(root)
+                break
+            pv = self._principal_variation(game, d)
+            best = (pv[0] if pv else None, score, pv)
+            if self.cache is not None and pv:
+                self.cache.put(key, d, score, pv[0], pv)
+            if info:
+                info(d, score, self.nodes, pv)
+            if abs(score) > self.WIN - 100:  # forced result
+                break
+
+        if best is None or best[0] is None:  # stopped too early
+            steps = game.valid_steps()
+            first = game.step_to_str(*steps[0]) if steps else None
+            best = (first, 0, [first] if first else [])
+        return best
+
+    def _check_stop(self):
+        if self.stop_event.is_set():
+            raise SearchStopped
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchStopped
+
+    def _ordered_steps(self, game, tt_step):
+        steps = game.valid_steps()
+        # captures first, then the remembered best step in front of all
+        steps.sort(key=lambda step: not game.at_node[step[1]])
+        if tt_step is not None:
+            for i, step in enumerate(steps):
+                if game.step_to_str(*step) == tt_step:
+                    steps.insert(0, steps.pop(i))
+                    break
+        return steps
+
+    def _negamax(self, game, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes % 256:
+            self._check_stop()
+
+        if game.winner:  # whoever just moved has won
+            return -(self.WIN - ply)
+        if depth == 0:
+            return self.evaluate(game)
+
+        key = game.fen()
+        tt_step = None
+        entry = self.table.get(key)
+        if entry:
+            e_depth, e_score, e_flag, tt_step = entry
+            e_score = self._from_table(e_score, ply)
+            if e_depth >= depth:
+                if e_flag == self.EXACT:
+                    return e_score
+                if e_flag == self.LOWER and e_score >= beta:
+                    return e_score
+                if e_flag == self.UPPER and e_score <= alpha:
+                    return e_score
+
+        alpha0 = alpha
+        best_score, best_step = -self.INF, None
+        snap = game.snapshot()
+        for marker, dest in self._ordered_steps(game, tt_step):
+            step = game.step_to_str(marker, dest)
+            game.step(marker, dest)
+            score = -self._negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.restore(snap)
+            if score > best_score:
+                best_score, best_step = score, step
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_step is None:  # no steps available
+            return 0
+
+        if best_score <= alpha0:
+            flag = self.UPPER
+        elif best_score >= beta:
+            flag = self.LOWER
+        else:
+            flag = self.EXACT
+        self.table[key] = (depth, self._to_table(best_score, ply), flag, best_step)
+        return best_score
+
+    def _to_table(self, score, ply):
+        # wins are stored relative to the node, not to the root
+        if score > self.WIN - 100:
+            return score + ply
+        if score < -self.WIN + 100:
+            return score - ply
+        return score
+
+    def _from_table(self, score, ply):
+        if score > self.WIN - 100:
+            return score - ply
+        if score < -self.WIN + 100:
+            return score + ply
+        return score
+
+    def _principal_variation(self, game, depth):
+        root = game.snapshot()
+        pv, seen = [], set()
+        while len(pv) < depth and not game.winner:
+            key = game.fen()
+            entry = self.table.get(key)
+            if not entry or key in seen:
+                break
+            seen.add(key)
+            step = game.step_from_str(entry[3])
+            if not step:
+                break
+            pv.append(entry[3])
+            game.step(*step)
+        game.restore(root)
+        return pv
+
+
+
+def self_play(player, depth=3, random_plies=2, max_plies=200, rng=random):
+    # fen of every position of one game, first to last
+    game = Janggi()
+    game.reset()
+    yield game.fen()
+    while not game.winner and game.turn < max_plies:
+        if game.turn < random_plies:  # otherwise every game is the same
+            steps = game.valid_steps()
+            step = steps and rng.choice(steps)
+        else:
+            text, _, _ = player.search(game, depth=depth)
+            step = text and game.step_from_str(text)
+        if not step:
+            return
+        game.step(*step)
+        yield game.fen()